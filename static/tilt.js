@@ -0,0 +1,155 @@
+// dot colors per Tilt color name
+const COLORS = {
+  Red: "#FF4B4B",
+  Green: "#4BFF4B",
+  Black: "#222222",
+  Purple: "#A020F0",
+  Orange: "#FFA500",
+  Blue: "#4B4BFF",
+  Yellow: "#FFFF4B",
+  Pink: "#FF69B4",
+  Unknown: "#CCCCCC"
+};
+
+// pid -> the card's live elements, looked up once when the card is built
+const cards = new Map();
+const OG_DEBOUNCE_MS = 150;
+
+// OG is stored by the server (shared by every browser), which parses
+// "1.060" / "1060", computes ABV and pushes it back through /stream
+function postOG(pid, value) {
+  fetch('/api/og', {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ pid: pid, og: value.trim() || null })
+  }).catch(console.error);
+}
+
+function initOGInput(pid, info, inp) {
+  // earlier versions kept OG in this browser's localStorage, under the
+  // printed NSUUID ("<__NSConcreteUUID 0x...> <UUID>"); hand it over once
+  const oldKeys = Object.keys(localStorage).filter(
+    (k) => k === 'og-' + pid || (k.startsWith('og-') && k.endsWith(' ' + pid)));
+  const saved = oldKeys.map((k) => localStorage.getItem(k)).find((v) => v);
+  if (saved && info.og == null) postOG(pid, saved);
+  oldKeys.forEach((k) => localStorage.removeItem(k));
+
+  // send once typing pauses, not a request per keystroke
+  let timer;
+  inp.addEventListener('input', () => {
+    clearTimeout(timer);
+    timer = setTimeout(() => postOG(pid, inp.value), OG_DEBOUNCE_MS);
+  });
+}
+
+// build the card for a newly seen Tilt and return its elements; values are
+// filled in by renderDevice
+function ensureCard(pid, info) {
+  const known = cards.get(pid);
+  if (known) return known;
+  const empty = document.getElementById('no-devices');
+  if (empty) empty.remove();
+
+  const card = document.createElement('div');
+  card.className = 'tilt-card';
+  card.id = 'card-' + pid;
+  card.innerHTML = `
+<div class="tilt-sub">
+<span class="dot" style="background: ${COLORS[info.color] || COLORS.Unknown};" title="${info.color}"></span>
+<span class="chip chip-rssi">RSSI: <span id="rssi-${pid}">N/A</span></span>
+<span class="chip chip-og">
+  OG:
+  <input id="og-${pid}" class="og-input" type="text" inputmode="decimal" placeholder="1.060 or 1060">
+</span>
+</div>
+<div class="stats">
+<div class="stat">
+  <div class="stat-label">Temperature</div>
+  <div class="stat-value stat-temp"><span id="temp-${pid}">--</span> C</div>
+</div>
+<div class="stat">
+  <div class="stat-label">Gravity</div>
+  <div class="stat-value stat-grav"><span id="grav-${pid}">--</span></div>
+</div>
+<div class="stat">
+  <div class="stat-label">ABV</div>
+  <div class="stat-value stat-abv"><span id="abv-${pid}">--</span> %</div>
+</div>
+</div>
+
+<!-- Full packet at end of card -->
+<div class="raw-block" id="rawfull-${pid}"></div>`;
+  document.getElementById('cards').appendChild(card);
+
+  const els = {
+    temp: document.getElementById('temp-' + pid),
+    grav: document.getElementById('grav-' + pid),
+    rssi: document.getElementById('rssi-' + pid),
+    og:   document.getElementById('og-' + pid),
+    abv:  document.getElementById('abv-' + pid),
+    raw:  document.getElementById('rawfull-' + pid)
+  };
+  cards.set(pid, els);
+  initOGInput(pid, info, els.og);
+  return els;
+}
+
+// write only when the value differs, so unchanged fields don't invalidate layout
+function setText(el, text) {
+  if (el.textContent !== text) el.textContent = text;
+}
+
+function renderDevice(pid, info) {
+  const els = ensureCard(pid, info);
+
+  // display strings come pre-formatted from the BLE callback
+  if (info.temp_str != null) setText(els.temp, info.temp_str);
+  if (info.grav_str != null) setText(els.grav, info.grav_str);
+  if (info.rssi != null)     setText(els.rssi, String(info.rssi));
+
+  // OG and ABV come from the server; don't overwrite an OG being typed
+  const og = info.og != null ? info.og.toFixed(3) : '';
+  if (document.activeElement !== els.og && els.og.value !== og) els.og.value = og;
+  setText(els.abv, info.abv != null ? info.abv.toFixed(2) : '--');
+
+  // hex packet, with major/minor already highlighted by the server; compared
+  // by raw_hex so the markup is only reparsed when the packet changed
+  if (info.raw_html && els.raw.dataset.hex !== info.raw_hex) {
+    els.raw.innerHTML = info.raw_html;
+    els.raw.dataset.hex = info.raw_hex;
+  }
+}
+
+// devices received since the last frame; a newer message for a device
+// replaces an older one that was not drawn yet
+let pending = {};
+let frameRequested = false;
+
+function renderPending() {
+  const devices = pending;
+  pending = {};
+  frameRequested = false;
+  for (const [pid, info] of Object.entries(devices)) renderDevice(pid, info);
+}
+
+// full device map, or only the devices that changed; drawn on the next frame
+function applyDevices(devices) {
+  Object.assign(pending, devices);
+  if (!frameRequested) {
+    frameRequested = true;
+    requestAnimationFrame(renderPending);
+  }
+}
+
+// The server pushes the full device map on connect, then just the changed
+// devices (EventSource reconnects on its own and gets a fresh full map).
+const es = new EventSource('/stream');
+const onEvent = (apply) => (ev) => {
+  try {
+    apply(JSON.parse(ev.data));
+  } catch (e) {
+    console.error(e);
+  }
+};
+es.onmessage = onEvent(applyDevices);
+es.addEventListener('update', onEvent(applyDevices));
@@ -23,13 +23,16 @@ Prerequisites:
 """
 
 import os
+import sys
+import json
+import atexit
+import shutil
 import time
 import threading
-import binascii
 from datetime import datetime
 import struct
-from collections import deque
-import threading, time
+import queue
+import numpy as np
 
 # PyObjC / Objective-C Imports
 from Foundation import *
@@ -38,35 +41,306 @@ import objc
 
 # Store discovered Tilt device info in a global dictionary.
 #   Key:   peripheral.identifier() (unique ID for each BLE device)
-#   Value: dict with color, temperature, gravity, raw data, last_seen
+#   Value: TiltState with color, temperature, gravity, raw data, last_seen_ts
 discovered_devices = {}
+# Held by the BLE callback while it writes a TiltState; readers that need a
+# consistent reading take snapshot_devices() instead of reading live states.
+_devices_lock = threading.Lock()
 
-# after discovered_devices = {}
-history = {}  # pid -> deque([{'ts', 'temp_c', 'gravity', 'rssi'}])
+def device_key(pid):
+    """
+    Stable string id for a Tilt, used for it in JSON, history and og.json:
+    the peripheral's UUID string. (str() of an NSUUID includes the object's
+    address, which changes on every run.)
+    """
+    uuid_string = getattr(pid, 'UUIDString', None)
+    return str(uuid_string()) if uuid_string is not None else str(pid)
+
+class TiltState:
+    """
+    Latest reading for one Tilt. Updated in place by the BLE callback, so a
+    repeat advert writes a few slots instead of allocating a new dict.
+    """
+    __slots__ = ('color', 'temperature', 'temperature_c', 'gravity', 'rssi',
+                 'key', 'battery_weeks', 'tx_raw', 'tx_dbm', 'raw', 'raw_hex',
+                 'temp_str', 'grav_str', 'last_seen_ts', 'logged_ts', 'notified_ts',
+                 'version')
+
+    def __init__(self):
+        for name in self.__slots__:
+            setattr(self, name, None)
+
+    def copy(self):
+        other = TiltState.__new__(TiltState)
+        for name in self.__slots__:
+            setattr(other, name, getattr(self, name))
+        return other
+
+def snapshot_devices():
+    """
+    Returns {pid: TiltState copy} taken under the device lock, so no reading
+    is half-updated and later adverts don't change it while it is rendered.
+    """
+    with _devices_lock:
+        return {pid: st.copy() for pid, st in discovered_devices.items()}
+
+# Known Tilt color map from the official doc, built once at import.
+# Keys are lowercase to match bytes.hex() output.
+_COLOR_MAP = {
+    "a495bb10c5b14b44b5121370f02d74de": "Red",
+    "a495bb20c5b14b44b5121370f02d74de": "Green",
+    "a495bb30c5b14b44b5121370f02d74de": "Black",
+    "a495bb40c5b14b44b5121370f02d74de": "Purple",
+    "a495bb50c5b14b44b5121370f02d74de": "Orange",
+    "a495bb60c5b14b44b5121370f02d74de": "Blue",
+    "a495bb70c5b14b44b5121370f02d74de": "Yellow",
+    "a495bb80c5b14b44b5121370f02d74de": "Pink"
+}
+# Same map keyed on the raw 16-byte UUID so adverts are matched without hex conversion
+_COLOR_MAP_BYTES = {bytes.fromhex(k): v for k, v in _COLOR_MAP.items()}
+
+class HistoryRing:
+    """
+    Fixed-size ring buffer of history samples for one Tilt.
+
+    Samples are kept as parallel NumPy arrays (epoch ms, °C, SG, RSSI dBm;
+    NaN when unknown) rather than
+    a deque of per-sample dicts; once full, the oldest sample is overwritten.
+    Each append also publishes an ordered, read-only snapshot, so readers on
+    other threads neither copy the ring nor see a half-written sample.
+    """
+    def __init__(self, maxlen, color='Unknown'):
+        self.maxlen  = maxlen
+        self.color   = color
+        self.ts      = np.empty(maxlen, dtype=np.int64)
+        self.temp_c  = np.empty(maxlen, dtype=np.float64)
+        self.gravity = np.empty(maxlen, dtype=np.float64)
+        self.rssi    = np.empty(maxlen, dtype=np.float64)
+        self.head    = 0  # next slot to write
+        self.size    = 0
+        self.snapshot = self._ordered_copy()
+        self.view     = self._make_view()
+
+    def append(self, ts, temp_c, gravity, rssi):
+        i = self.head
+        self.ts[i]      = ts
+        self.temp_c[i]  = temp_c
+        self.gravity[i] = gravity
+        self.rssi[i]    = rssi if rssi is not None else np.nan
+        self.head = (i + 1) % self.maxlen
+        if self.size < self.maxlen:
+            self.size += 1
+        self.snapshot = self._ordered_copy()
+        self.view     = self._make_view()
+
+    def last(self):
+        """
+        Returns the newest (ts, temp_c, gravity) sample, or None if empty.
+        """
+        if self.size == 0:
+            return None
+        i = self.head - 1  # -1 wraps to the last slot
+        return int(self.ts[i]), float(self.temp_c[i]), float(self.gravity[i])
+
+    def _ordered_copy(self):
+        """
+        Returns read-only copies of (ts, temp_c, gravity, rssi), oldest sample first.
+        """
+        if self.size < self.maxlen:
+            n = self.size
+            cols = (self.ts[:n].copy(), self.temp_c[:n].copy(),
+                    self.gravity[:n].copy(), self.rssi[:n].copy())
+        else:
+            h = self.head
+            cols = (np.concatenate((self.ts[h:], self.ts[:h])),
+                    np.concatenate((self.temp_c[h:], self.temp_c[:h])),
+                    np.concatenate((self.gravity[h:], self.gravity[:h])),
+                    np.concatenate((self.rssi[h:], self.rssi[:h])))
+        for col in cols:
+            col.setflags(write=False)
+        return cols
+
+    def _make_view(self):
+        """
+        Returns the snapshot in wire form: {'color', 'ts', 'temp_c', 'gravity', 'rssi'}.
+        """
+        ts, temp_c, gravity, rssi = self.snapshot
+        return {'color': self.color, 'ts': ts, 'temp_c': temp_c,
+                'gravity': gravity, 'rssi': rssi}
+
+def history_since(view, since):
+    """
+    Returns a device's history view (see history_view) keeping only samples
+    newer than 'since' (epoch ms).
+    """
+    # samples are in time order: binary search, then slice views (no copies)
+    i = int(np.searchsorted(view['ts'], since, side='right'))
+    if i == 0:
+        return view
+    return {'color': view['color'], 'ts': view['ts'][i:], 'temp_c': view['temp_c'][i:],
+            'gravity': view['gravity'][i:], 'rssi': view['rssi'][i:]}
+
+history = {}  # device_key -> HistoryRing of (ts, temp_c, gravity, rssi)
 _history_lock = threading.Lock()
+history_version = 0  # bumped (under _history_lock) on every appended sample
+# History as served: device_key -> {'color', 'ts', 'temp_c', 'gravity', 'rssi'}
+# with NumPy columns (serialize with orjson.OPT_SERIALIZE_NUMPY). Replaced
+# wholesale after each append and never mutated, so readers just load the
+# reference: no lock, no copy, no per-request key or color lookups.
+history_view = {}
+
+# Bumped whenever a device's reading changes (or on the logging heartbeat,
+# which refreshes RSSI/last-seen for idle Tilts); waiters on _update_cond
+# (e.g. the dashboard's event stream) are woken on each bump.
+devices_version = 0
+devices_modified_ts = 0.0  # epoch seconds of the latest bump
+_update_cond = threading.Condition()
+
+# Bumps are coalesced: several Tilts reporting within the same window
+# produce one new version, so snapshots are rebuilt at most ~5 times/s.
+UPDATE_MIN_INTERVAL = 0.2  # seconds
+_update_dirty = threading.Event()
+_pending_pids = set()  # changed since the last bump; add/pop are atomic, so no lock
+_publisher_started = False
+
+def _publisher_loop(interval):
+    """
+    Publishes pending changes as one devices_version bump, stamping each
+    changed TiltState with that version, then waits 'interval' seconds so
+    that bursts collapse into the next bump.
+    """
+    global devices_version, devices_modified_ts
+    while True:
+        _update_dirty.wait()
+        _update_dirty.clear()
+        with _update_cond:
+            devices_version += 1
+            devices_modified_ts = time.time()
+            with _devices_lock:
+                while _pending_pids:
+                    discovered_devices[_pending_pids.pop()].version = devices_version
+            _update_cond.notify_all()
+        time.sleep(interval)
+
+def _start_publisher():
+    """
+    Start the background version publisher thread. Safe to call more than once.
+    """
+    global _publisher_started
+    with _update_cond:
+        if _publisher_started:
+            return
+        _publisher_started = True
+    publisher = threading.Thread(target=_publisher_loop, args=(UPDATE_MIN_INTERVAL,), daemon=True)
+    publisher.start()
+
+def _notify_update(pid):
+    if not _publisher_started:
+        _start_publisher()
+    _pending_pids.add(pid)
+    _update_dirty.set()
+
+def wait_for_update(seen_version, timeout=None):
+    """
+    Blocks until devices_version differs from 'seen_version' or 'timeout'
+    seconds pass. Returns the current devices_version.
+    """
+    with _update_cond:
+        _update_cond.wait_for(lambda: devices_version != seen_version, timeout)
+        return devices_version
+
+# An unchanged reading is still logged (history + CSV) this often, as a liveness heartbeat
+HEARTBEAT_INTERVAL = 300.0  # seconds
+
+# A repeat advert whose RSSI moved republishes the device (not history/CSV)
+# at most this often, so the dashboard's RSSI and last-seen stay live
+LIVE_REFRESH_INTERVAL = 5.0  # seconds
+
+def _same_reading(temp_c, gravity, last_temp_c, last_gravity):
+    """
+    True if two readings are equal within the Tilt's resolution.
+    """
+    return abs(last_temp_c - temp_c) < 0.1 and abs(last_gravity - gravity) < 0.0005
 
-def _append_history(pid, temp_c, gravity):
+def _append_history(key, color, temp_c, gravity, rssi):
+    global history_version, history_view
+    now_ms = int(time.time() * 1000)
     with _history_lock:
-        dq = history.get(pid)
-        if dq is None:
-            dq = deque(maxlen=3600)  # ~2 hours at 2s cadence
-            history[pid] = dq
-        dq.append({
-            'ts': int(time.time() * 1000),
-            'temp_c': temp_c,
-            'gravity': gravity
-        })
+        ring = history.get(key)
+        if ring is None:
+            ring = HistoryRing(3600, color)  # ~2 hours at 2s cadence
+            history[key] = ring
+        last = ring.last()
+        if (last is not None and now_ms - last[0] < HEARTBEAT_INTERVAL * 1000
+                and _same_reading(temp_c, gravity, last[1], last[2])):
+            return
+        ring.append(now_ms, temp_c, gravity, rssi)
+        history_view = {k: r.view for k, r in history.items()}
+        history_version += 1
+
+# Lines (and terminal width) of the last frame drawn by print_panel, so
+# unchanged rows are not re-emitted.
+_last_frame = []
+_last_width = 0
 
 def clear_terminal():
     """
-    Clears the terminal screen, using 'cls' on Windows or 'clear' on other OSes.
+    Clears the terminal screen with ANSI escapes (no 'clear' subprocess) and
+    forces the next print_panel to redraw every row.
     """
-    os.system("cls" if os.name == "nt" else "clear")
+    global _last_frame
+    sys.stdout.write("\x1b[2J\x1b[H")
+    _last_frame = []
+
+
+def _draw_frame(lines):
+    """
+    Draws 'lines' from the top of the terminal, rewriting only the rows that
+    differ from the previous frame. Falls back to a full redraw when the
+    layout (line count, line lengths or terminal width) changes.
+    """
+    global _last_frame, _last_width
+    width = shutil.get_terminal_size().columns
+    if (width != _last_width or len(lines) != len(_last_frame)
+            or any(len(a) != len(b) for a, b in zip(lines, _last_frame))):
+        clear_terminal()
+    prev = _last_frame
+
+    out = []
+    row = 1
+    for i, line in enumerate(lines):
+        if i >= len(prev) or prev[i] != line:
+            out.append(f"\x1b[{row};1H{line}\x1b[K")
+        row += max(1, -(-len(line) // width))  # long lines wrap
+    out.append(f"\x1b[{row};1H")  # park the cursor below the table
+    sys.stdout.write("".join(out))
+    sys.stdout.flush()
+
+    _last_frame = lines
+    _last_width = width
+
+
+# Console table layout, formatted once at import
+_ROW_FMT = "{:36s} | {:8s} | {:9s} | {:8s} | {:12s} | {:12s} | {:19s} | {}".format
+_HEADER_LINES = (
+    "=== Tilt Hydrometer Data ===",
+    _ROW_FMT(
+        "Peripheral ID",
+        "Color",
+        "Temp (F)",
+        "Temp (C)",
+        "Gravity",
+        "Batt (weeks)",
+        "Last Seen",
+        "Raw Data"
+    ),
+    "-" * 120,
+)
 
 
 def print_panel():
     """
-    Clears the terminal and prints a table of discovered Tilt devices.
+    Draws a table of discovered Tilt devices, updating only changed rows.
     Includes:
       - Peripheral ID
       - Color (mapped from the Tilt's UUID)
@@ -77,33 +351,22 @@ def print_panel():
       - Last-seen timestamp
       - Raw manufacturer data in hex
     """
-    clear_terminal()
-    print("=== Tilt Hydrometer Data ===")
-    print("{:36s} | {:8s} | {:9s} | {:8s} | {:12s} | {:12s} | {:19s} | {}".format(
-        "Peripheral ID",
-        "Color",
-        "Temp (F)",
-        "Temp (C)",
-        "Gravity",
-        "Batt (weeks)",
-        "Last Seen",
-        "Raw Data"
-    ))
-    print("-" * 120)
-
-    # Iterate over each discovered device and print a row.
-    for pid, info in discovered_devices.items():
-        color     = info.get("color", "N/A")
-        temp      = info.get("temperature", "N/A")
-        temp_c    = info.get("temperature_c", None)
-        temp_c    = f"{temp_c:.1f}" if isinstance(temp_c, (int, float)) else "N/A"        
-        gravity   = info.get("gravity", "N/A")
-        batt_wks  = info.get("battery_weeks", None)
-        batt_wks  = str(batt_wks) if batt_wks is not None else "N/A"        
-        raw_hex   = info.get("raw_hex", "N/A")
-        last_seen = info.get("last_seen", "N/A")
-
-        print("{:36s} | {:8s} | {:9s} | {:8s} | {:12s} | {:12s} | {:19s} | {}".format(
+    lines = list(_HEADER_LINES)
+
+    # Iterate over a snapshot (the BLE callback may add devices meanwhile) and
+    # print a row.
+    for pid, info in snapshot_devices().items():
+        color     = info.color
+        temp      = info.temperature
+        temp_c    = info.temperature_c
+        temp_c    = f"{temp_c:.1f}" if temp_c is not None else "N/A"
+        gravity   = info.gravity
+        batt_wks  = info.battery_weeks
+        batt_wks  = str(batt_wks) if batt_wks is not None else "N/A"
+        raw_hex   = info.raw_hex
+        last_seen = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(info.last_seen_ts))
+
+        lines.append(_ROW_FMT(
             str(pid),
             color,
             str(temp),
@@ -114,7 +377,9 @@ def print_panel():
             raw_hex
         ))
 
-    print("\n(Press Ctrl+C to stop)")
+    lines.append("")
+    lines.append("(Press Ctrl+C to stop)")
+    _draw_frame(lines)
 
 
 def refresh_panel_forever(interval=2.0):
@@ -126,6 +391,35 @@ def refresh_panel_forever(interval=2.0):
         time.sleep(interval)
 
 
+# Apple company ID (0x004C, little-endian) + iBeacon type/length (0x02 0x15)
+_IBEACON_PREFIX = b'\x4c\x00\x02\x15'
+# iBeacon tail at offset 20: major (uint16), minor (uint16), Tx power (int8)
+_TAIL_STRUCT = struct.Struct('>HHb')
+# Lookup tables covering every realistic raw reading (°F < 256, SG < 2.048);
+# anything outside falls back to arithmetic in _decode_tail.
+_F_TO_C = tuple((f - 32) * 5.0 / 9.0 for f in range(256))
+_GRAV   = tuple(g / 1000.0 for g in range(2048))
+
+
+def _decode_tail(data_bytes):
+    """
+    Decodes the numeric iBeacon tail (bytes 20..24) of a Tilt advertisement.
+
+    Returns:
+      (temperature °F, temperature °C, gravity SG, tx_raw, tx_dbm)
+    """
+    # Major (temp °F), minor (gravity * 1000) and signed Tx power in one unpack
+    temperature, grav_raw, tx_dbm = _TAIL_STRUCT.unpack_from(data_bytes, 20)
+    temperature_c = (_F_TO_C[temperature] if temperature < 256
+                     else (temperature - 32) * 5.0 / 9.0)
+    gravity       = _GRAV[grav_raw] if grav_raw < 2048 else grav_raw / 1000.0
+    return (temperature,
+            temperature_c,
+            gravity,
+            tx_dbm & 0xFF,  # unsigned form
+            tx_dbm)
+
+
 def parse_tilt_advertisement(data_bytes):
     """
     Attempts to parse a Tilt hydrometer's iBeacon-like manufacturer data.
@@ -146,40 +440,19 @@ def parse_tilt_advertisement(data_bytes):
         return None
 
     # Check for iBeacon prefix (Apple ID + iBeacon indicator)
-    if data_bytes[0:2] != b'\x4c\x00' or data_bytes[2:4] != b'\x02\x15':
+    if not data_bytes.startswith(_IBEACON_PREFIX):
         return None
 
     uuid_bytes = data_bytes[4:20]
-    major      = data_bytes[20:22]
-    minor      = data_bytes[22:24]
-    tx_byte    = data_bytes[24]
-
-    temperature = int.from_bytes(major, byteorder='big')    # 2 bytes -> int
-    temperature_c = (temperature - 32) * 5.0 / 9.0
-    gravity     = int.from_bytes(minor, byteorder='big')/1000.0
-
-    # Convert Tilt's 16-byte UUID into an uppercase hex string
-    uuid_str = binascii.hexlify(uuid_bytes).decode('utf-8').upper()
-
-    # Known Tilt color map from the official doc
-    color_map = {
-        "A495BB10C5B14B44B5121370F02D74DE": "Red",
-        "A495BB20C5B14B44B5121370F02D74DE": "Green",
-        "A495BB30C5B14B44B5121370F02D74DE": "Black",
-        "A495BB40C5B14B44B5121370F02D74DE": "Purple",
-        "A495BB50C5B14B44B5121370F02D74DE": "Orange",
-        "A495BB60C5B14B44B5121370F02D74DE": "Blue",
-        "A495BB70C5B14B44B5121370F02D74DE": "Yellow",
-        "A495BB80C5B14B44B5121370F02D74DE": "Pink"
-    }
-    color = color_map.get(uuid_str, "Unknown")
 
-    # 0..152 => weeks since battery change; 0xC5 (-59) is legacy/placeholder, ignore.
-    tx_raw        = tx_byte
-    tx_dbm        = struct.unpack('b', bytes([tx_byte]))[0]  # signed form
-    battery_weeks = tx_raw if 0 <= tx_raw <= 152 else None
-    if tx_raw == 0xC5:
-        battery_weeks = None
+    temperature, temperature_c, gravity, tx_raw, tx_dbm = _decode_tail(data_bytes)
+
+    # Look up the color directly on the raw 16-byte UUID (no hex conversion)
+    color = _COLOR_MAP_BYTES.get(uuid_bytes, "Unknown")
+
+    # 0..152 => weeks since battery change; anything else (including the
+    # legacy 0xC5 / -59 dBm placeholder) is not a battery age.
+    battery_weeks = tx_raw if tx_raw <= 152 else None
 
     return {
         "color":       color,
@@ -211,7 +484,10 @@ class CentralManagerDelegate(NSObject):
         if central.state() == 5:
             print("Bluetooth is powered on. Scanning for Tilt advertisements...")
             self.central = central
-            # Scan for all peripherals, allowing duplicates so we get repeated updates
+            # Scan for all peripherals, allowing duplicates so we get repeated updates.
+            # Tilts are iBeacons: they carry their UUID in manufacturer data and
+            # advertise no service UUIDs, so a service filter here would drop them.
+            # Non-Tilt adverts are rejected cheaply at the top of the callback.
             self.central.scanForPeripheralsWithServices_options_(
                 None,
                 { CBCentralManagerScanOptionAllowDuplicatesKey: True }
@@ -227,10 +503,40 @@ class CentralManagerDelegate(NSObject):
         with advertisement data. We filter for Tilt manufacturer data.
         """
         manufacturer_data = advertisementData.get("kCBAdvDataManufacturerData", None)
-        if not manufacturer_data:
-            return  # Not a manufacturer data packet
+        if manufacturer_data is None or manufacturer_data.length() < 25:
+            return  # No manufacturer data, or too short for a Tilt iBeacon
+
+        # Peek at the iBeacon prefix through NSData's buffer (no copy); most
+        # adverts on the air are not iBeacons and stop here.
+        if memoryview(manufacturer_data)[:4] != _IBEACON_PREFIX:
+            return  # Not an iBeacon, so not a Tilt
 
         data_bytes = bytes(manufacturer_data)
+
+        # Convert NSNumber -> int; 127 means "not available" on iOS/macOS.
+        # PyObjC hands NSNumber over as a Python int subclass, so int() is a
+        # plain conversion and cannot fail here.
+        rssi_dbm = int(RSSI) if RSSI is not None else None
+        if rssi_dbm == 127:
+            rssi_dbm = None
+
+        # With AllowDuplicates the same advert repeats every ~100 ms; when the
+        # payload is unchanged only RSSI/last_seen_ts need refreshing.
+        pid  = peripheral.identifier()
+        prev = discovered_devices.get(pid)
+        if prev is not None and prev.raw == data_bytes:
+            now = time.time()
+            rssi_changed = prev.rssi != rssi_dbm
+            with _devices_lock:
+                prev.rssi         = rssi_dbm
+                prev.last_seen_ts = now
+            if now - prev.logged_ts >= HEARTBEAT_INTERVAL:
+                _log_reading(pid, prev, now)
+            elif rssi_changed and now - prev.notified_ts >= LIVE_REFRESH_INTERVAL:
+                prev.notified_ts = now
+                _notify_update(pid)
+            return
+
         tilt_info  = parse_tilt_advertisement(data_bytes)
 
    #     if tilt_info:
@@ -244,90 +550,257 @@ class CentralManagerDelegate(NSObject):
    #             f"signed={tx_dbm if tx_dbm is not None else '??'} "
    #             f"weeks={'N/A' if batt is None else batt}")
 
-# Convert NSNumber -> int; 127 means "not available" on iOS/macOS
-        try:
-            rssi_dbm = int(RSSI)  # PyObjC will coerce NSNumber
-        except Exception:
-            rssi_dbm = None
-        if rssi_dbm == 127:
-            rssi_dbm = None
-
         if tilt_info:
-            pid = peripheral.identifier()
-            discovered_devices[pid] = {
-                "color":       tilt_info["color"],
-                "temperature": tilt_info["temperature"],
-                "temperature_c": tilt_info.get("temperature_c"),                
-                "gravity":     tilt_info["gravity"],
-                "rssi":          rssi_dbm,
-                "battery_weeks": tilt_info.get("battery_weeks"),
-                "tx_raw": tilt_info.get("tx_raw"),
-                "tx_dbm": tilt_info.get("tx_dbm"),
-                "raw_hex":     data_bytes.hex(),
-                "last_seen":   datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            }
-            _append_history(pid,
-                    tilt_info.get("temperature_c"),
-                    tilt_info["gravity"])
-
-            # Write a CSV line for each new advertisement (single-tilt case)
-            try:
-                now_dt = datetime.now()
-                append_to_mead_csv(now_dt, tilt_info["gravity"], tilt_info.get("temperature_c", 0.0))
-            except Exception:
-                pass
+            # Fill the state before publishing a new one, so readers never
+            # see a half-initialised device.
+            st = prev if prev is not None else TiltState()
+            if prev is None:
+                st.key = device_key(pid)  # built once per Tilt
+            # formatted once per new payload; repeats keep them
+            raw_hex  = data_bytes.hex()
+            temp_str = f"{tilt_info['temperature_c']:.2f}"
+            grav_str = f"{tilt_info['gravity']:.3f}"
+            with _devices_lock:
+                st.color         = tilt_info["color"]
+                st.temperature   = tilt_info["temperature"]
+                st.temperature_c = tilt_info["temperature_c"]
+                st.gravity       = tilt_info["gravity"]
+                st.rssi          = rssi_dbm
+                st.battery_weeks = tilt_info["battery_weeks"]
+                st.tx_raw        = tilt_info["tx_raw"]
+                st.tx_dbm        = tilt_info["tx_dbm"]
+                st.raw           = data_bytes
+                st.raw_hex       = raw_hex
+                st.temp_str      = temp_str
+                st.grav_str      = grav_str
+                st.last_seen_ts  = time.time()   # formatted only when rendered
+                if prev is None:
+                    discovered_devices[pid] = st
+            _log_reading(pid, st, st.last_seen_ts)
+
+def _log_reading(pid, st, now):
+    """
+    Records a Tilt's current reading in history and mead.csv, and bumps
+    devices_version. History and CSV skip a reading equal to the last one
+    logged, unless HEARTBEAT_INTERVAL has passed.
+    """
+    st.logged_ts = now
+    st.notified_ts = now
+    _append_history(st.key, st.color, st.temperature_c, st.gravity, st.rssi)
+    _notify_update(pid)
+
+    # Write a CSV line for the reading (single-tilt case)
+    try:
+        append_to_mead_csv(datetime.fromtimestamp(now), st.gravity, st.temperature_c, st.key)
+    except Exception:
+        pass
 
 # --- Add CSV append helper and lock ---
 CSV_PATH = os.path.join(os.path.dirname(__file__), 'mead.csv')
 _csv_lock = threading.Lock()
 
+# Lines are queued by the BLE callback and written in batches by one thread,
+# so the hot path never touches the filesystem.
+_csv_queue = queue.Queue()
+_csv_pending = threading.Event()  # set when lines are queued; wakes the writer
+_csv_writer_started = False
+CSV_FLUSH_INTERVAL = 2.0  # seconds between batched writes
+_csv_last = {}  # device_key -> (epoch s, gravity, temp_c) of its last queued row
+
+# True while mead.csv lacks a trailing newline; checked once by ensure_csv_header
+_csv_needs_newline = False
+
 def ensure_csv_header():
     """
-    Ensure mead.csv exists and contains the header line.
+    Ensure mead.csv exists and contains the header line, and record whether
+    an existing file ends without a newline (so the next row would join it).
     Safe to call repeatedly.
     """
     with _csv_lock:
+        _ensure_csv_header_locked()
+
+def _ensure_csv_header_locked():
+    # ensure_csv_header() body; the caller holds _csv_lock
+    global _csv_needs_newline
+    if not os.path.exists(CSV_PATH):
+        with open(CSV_PATH, 'w', encoding='utf-8') as f:
+            f.write('Timepoint,SG,Temp (°C)\n')
+        _csv_needs_newline = False
+        return
+
+    try:
+        with open(CSV_PATH, 'rb') as rf:
+            rf.seek(0, os.SEEK_END)
+            size = rf.tell()
+            if size > 0:
+                rf.seek(size - 1)
+                _csv_needs_newline = rf.read(1) != b'\n'
+    except Exception:
+        # non-fatal - continue to append
+        pass
+
+def _drain_csv_queue(lines):
+    """
+    Appends every line currently queued to 'lines' without blocking.
+    """
+    while True:
+        try:
+            lines.append(_csv_queue.get_nowait())
+        except queue.Empty:
+            return lines
+
+def _write_csv_lines(lines):
+    """
+    Appends 'lines' to mead.csv with a single open/write. The caller holds _csv_lock.
+    """
+    global _csv_needs_newline
+    try:
+        # recreate the header if mead.csv was rotated (new-mead.sh)
         if not os.path.exists(CSV_PATH):
-            with open(CSV_PATH, 'w', encoding='utf-8') as f:
-                f.write('Timepoint,SG,Temp (°C)\n')
+            _ensure_csv_header_locked()
+        with open(CSV_PATH, 'a', encoding='utf-8') as f:
+            # every line we write ends with '\n', so this only fires once
+            if _csv_needs_newline:
+                f.write('\n')
+                _csv_needs_newline = False
+            f.write(''.join(lines))
+    except Exception as e:
+        # keep scan running even if disk write fails
+        print(f"Failed to append to {CSV_PATH}: {e}")
 
-def append_to_mead_csv(timepoint_dt, gravity, temp_c):
+def _csv_writer_loop(interval):
     """
-    Append a line like:
+    Runs in a background thread: waits for queued CSV lines, then appends
+    everything queued so far with a single open/write, every 'interval' seconds.
+    """
+    ensure_csv_header()
+
+    while True:
+        _csv_pending.wait()
+        _csv_pending.clear()
+        # lines leave the queue only under the lock, so flush_csv at exit
+        # writes anything this thread has not written yet
+        with _csv_lock:
+            lines = _drain_csv_queue([])
+            if lines:
+                _write_csv_lines(lines)
+
+        time.sleep(interval)
+
+def flush_csv():
+    """
+    Writes any lines still waiting for the background writer. Registered
+    with atexit and called on Ctrl+C, so the last readings reach mead.csv.
+    """
+    with _csv_lock:
+        lines = _drain_csv_queue([])
+        if lines:
+            _write_csv_lines(lines)
+
+atexit.register(flush_csv)
+
+def _start_csv_writer():
+    """
+    Start the background CSV writer thread. Safe to call more than once.
+    """
+    global _csv_writer_started
+    with _csv_lock:
+        if _csv_writer_started:
+            return
+        _csv_writer_started = True
+    writer = threading.Thread(target=_csv_writer_loop, args=(CSV_FLUSH_INTERVAL,), daemon=True)
+    writer.start()
+
+def append_to_mead_csv(timepoint_dt, gravity, temp_c, key=None):
+    """
+    Queue a line like:
       12/31/2024 15:42:49,1.001,22.8
+    for the background writer to append to mead.csv. Skipped if the reading
+    equals the last one queued for the same Tilt and HEARTBEAT_INTERVAL has
+    not passed.
     timepoint_dt: datetime
     gravity: float (SG)
     temp_c: float (°C)
+    key: device_key of the Tilt the reading came from
     """
-    try:
-        ensure_csv_header()
-        line = f"{timepoint_dt.strftime('%m/%d/%Y %H:%M:%S')},{gravity:.3f},{temp_c:.1f}\n"
-        with _csv_lock:
-            # ensure file ends with newline so appended rows don't join the last line
-            need_newline = False
-            try:
-                with open(CSV_PATH, 'rb') as rf:
-                    rf.seek(0, os.SEEK_END)
-                    size = rf.tell()
-                    if size > 0:
-                        rf.seek(size - 1)
-                        last = rf.read(1)
-                        if last != b'\n':
-                            need_newline = True
-            except Exception:
-                # non-fatal - continue to append
-                pass
-
-            with open(CSV_PATH, 'a', encoding='utf-8') as f:
-                if need_newline:
-                    f.write('\n')
-                f.write(line)
-    except Exception as e:
-        # keep scan running even if disk write fails
-        print(f"Failed to append to {CSV_PATH}: {e}")
+    ts = timepoint_dt.timestamp()
+    last = _csv_last.get(key)
+    if (last is not None and ts - last[0] < HEARTBEAT_INTERVAL
+            and _same_reading(temp_c, gravity, last[2], last[1])):
+        return
+    _csv_last[key] = (ts, gravity, temp_c)
+
+    if not _csv_writer_started:
+        _start_csv_writer()
+    line = f"{timepoint_dt.strftime('%m/%d/%Y %H:%M:%S')},{gravity:.3f},{temp_c:.1f}\n"
+    _csv_queue.put_nowait(line)
+    _csv_pending.set()
 
 # --- end CSV helper ---
 
+# --- Original gravity (OG) per Tilt, for ABV ---
+OG_PATH = os.path.join(os.path.dirname(__file__), 'og.json')
+_og_lock = threading.Lock()
+
+def _load_og():
+    try:
+        with open(OG_PATH) as f:
+            saved = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(saved, dict):
+        return {}
+    # skip entries that aren't a plausible OG instead of failing the import
+    return {str(k): og for k, og in ((k, normalize_og(v)) for k, v in saved.items())
+            if og is not None}
+
+def normalize_og(value):
+    """
+    Parses an OG as typed, '1.060' or '1060' (points), into SG.
+    Returns None if it isn't a plausible OG.
+    """
+    if isinstance(value, bool):  # JSON true/false would pass as 1.0/0.0
+        return None
+    try:
+        og = float(value)
+    except (TypeError, ValueError):
+        return None
+    if og > 2:
+        og /= 1000.0  # 1060 means 1.060
+    return og if 0.9 < og < 2 else None
+
+# device_key -> OG (SG). Replaced wholesale by set_og, so readers need no lock.
+og_map = _load_og()
+
+def set_og(key, og):
+    """
+    Stores the OG (SG) for the Tilt whose device_key is 'key', or clears it
+    if og is None. Saved to OG_PATH first, and published only once saved (an
+    OSError leaves og_map unchanged); the device is then republished so
+    clients get the new ABV.
+    """
+    global og_map
+    with _og_lock:
+        new_map = dict(og_map)
+        if og is None:
+            new_map.pop(key, None)
+        else:
+            new_map[key] = og
+        tmp_path = OG_PATH + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(new_map, f)
+        os.replace(tmp_path, OG_PATH)
+        og_map = new_map
+    for pid, st in list(discovered_devices.items()):
+        if st.key == key:
+            _notify_update(pid)
+
+def abv(og, gravity):
+    """
+    ABV (%) from OG and current SG, using the standard 131.25 factor.
+    """
+    return max(0.0, (og - gravity) * 131.25)
+
 def main():
     """
     Main entry point:
@@ -347,12 +820,10 @@ def main():
     try:
         NSRunLoop.currentRunLoop().run()
     except KeyboardInterrupt:
+        flush_csv()
         print("\nStopped.")
 
-# tilt.py (add near the bottom)
-from CoreBluetooth import CBCentralManager
-import threading
-
+# --- Background scanner for the web dashboard ---
 _delegate = None
 _manager = None
 _ble_started = False
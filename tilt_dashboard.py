@@ -3,227 +3,293 @@
 Flask web dashboard for Tilt Hydrometer readings.
 Displays latest readings in large, colored text.
 """
-from flask import Flask, render_template_string
+import gzip
+import hashlib
+import os
 import threading
 import time
-from tilt import discovered_devices, refresh_panel_forever
-from flask import Flask, render_template_string, jsonify
-from tilt import discovered_devices, history, start_ble_scanner
-
-COLOR_MAP = {
-    "Red": "#FF4B4B",
-    "Green": "#4BFF4B",
-    "Black": "#222222",
-    "Purple": "#A020F0",
-    "Orange": "#FFA500",
-    "Blue": "#4B4BFF",
-    "Yellow": "#FFFF4B",
-    "Pink": "#FF69B4",
-    "Unknown": "#CCCCCC"
-}
-
-TEMPLATE = """
-<!DOCTYPE html>
-<html lang='en'>
-<head>
-  <meta http-equiv="refresh" content="3">
-  <meta charset='UTF-8'>
-  <title>Tilt Dashboard</title>
-  <style>
-    body { background: #fff; color: #111; font-family: Helvetica, Arial, sans-serif; }
-    .tilt-card {
-      margin: 20px auto; padding: 28px; border-radius: 20px;
-      width: 90%; max-width: 900px; text-align: center;
-      box-shadow: 0 4px 24px rgba(0,0,0,0.12);
-      background: #fff; border: 1px solid #e6e6e6;
-    }
-  .stat-abv { color: #34c759; }         /* green accent */
-  .chip-og { background:#f3f6ff; color:#123; border:1px solid #dbe6ff; }
-  .og-input {
-    width: 120px; padding: 4px 8px; margin-left: 6px;
-    border: 1px solid #ccd; border-radius: 8px; font: inherit;
-  }    
-    .tilt-title { font-size: 2.2em; font-weight: 800; margin-bottom: 6px; letter-spacing: -0.02em; }
-    .tilt-sub { color: #666; font-size: 0.95em; margin-bottom: 14px; display:flex; gap:10px; justify-content:center; align-items:center; flex-wrap:wrap; }
-    .dot { width: 10px; height: 10px; border-radius: 50%; display:inline-block; border: 1px solid rgba(0,0,0,0.25); }
-    .chip { display: inline-block; padding: 4px 10px; border-radius: 999px; font-size: 0.82em; font-weight: 700; }
-    .chip-rssi  { background: #e9f3ff; color: #0a84ff; border: 1px solid #d5e8ff; }
-    .hx-temp { color: #ff3b30; font-weight: 800; text-decoration: underline; }
-    .hx-grav { color: #0a84ff; font-weight: 800; text-decoration: underline; }
-    .stats { display: grid; gap: 12px; }
-    .stat { background: #f7f7f9; border: 1px solid #eee; border-radius: 14px; padding: 14px; }
-    .stat-label { text-transform: uppercase; font-weight: 700; font-size: 0.85em; letter-spacing: 0.06em; color: #666; margin-bottom: 6px; }
-    .stat-value { font-weight: 900; font-size: clamp(2.2rem, 6vw, 4rem); line-height: 1; letter-spacing: -0.02em; }
-    .stat-temp  { color: #ff3b30; }
-    .stat-grav  { color: #0a84ff; }
-    .raw-block {
-        margin-top: 14px;
-        padding: 10px 12px;
-        border: 1px solid #eee;
-        border-radius: 10px;
-        background: #f7f7f9;
-        font: 12px/1.4 ui-monospace, SFMono-Regular, Menlo, Monaco, Consolas, "Liberation Mono", monospace;
-        white-space: pre-wrap;     /* wrap long lines */
-        word-break: break-all;     /* break at any char */
-        color: #333;
-    }    
-  </style>
-</head>
-<body>
-  <h1 style='text-align:center;'>Tilt Hydrometer Dashboard</h1>
-
-  {% for pid, info in devices.items() %}
-<div class="tilt-card">
-<div class="tilt-sub">
-  <span class="dot" style="background: {{ colors[info['color']] }};" title="{{ info['color'] }}"></span>
-  <span class="chip chip-rssi">RSSI: <span id="rssi-{{ pid }}">{{ info.get('rssi', 'N/A') }}</span></span>
-  <span class="chip chip-og">
-    OG:
-    <input id="og-{{ pid }}" class="og-input" type="text" inputmode="decimal" placeholder="1.060 or 1060">
-  </span>
-</div>
-<div class="stats">
-  <div class="stat">
-    <div class="stat-label">Temperature</div>
-    <div class="stat-value stat-temp"><span id="temp-{{ pid }}">{{ "%.2f"|format(info['temperature_c']|float) }}</span> C</div>
-  </div>
-  <div class="stat">
-    <div class="stat-label">Gravity</div>
-    <div class="stat-value stat-grav"><span id="grav-{{ pid }}">{{ "%.3f"|format(info['gravity']|float) }}</span></div>
-  </div>
-  <div class="stat">
-    <div class="stat-label">ABV</div>
-    <div class="stat-value stat-abv"><span id="abv-{{ pid }}">--</span> %</div>
-  </div>
-</div>
-
-  <!-- Full packet at end of card -->
-  <div class="raw-block" id="rawfull-{{ pid }}">{{ info['raw_hex'] }}</div>
-</div>
-  {% else %}
-    <div style='text-align:center; margin-top:40px;'>No Tilt devices found.</div>
-  {% endfor %}
-
-<script>
-  // keep a copy of the latest device data so ABV can update instantly on OG edits
-  let lastDevices = {};
-  const attached = new Set();
-
-  function normalizeOG(ogStr) {
-    const og = parseFloat(ogStr);
-    if (isNaN(og)) return null;
-    // If user typed 1060, treat it as 1.060
-    return og > 2 ? og / 1000.0 : og;
-  }
-
-  function calcABV(ogStr, sg) {
-    if (sg == null) return null;
-    const og = normalizeOG(ogStr);
-    if (og == null) return null;
-    // Standard formula for SG in 1.xxx units
-    // If you choose to enter OG as 1060, normalizeOG already fixed it.
-    const abv = (og - sg) * 131.25;
-    return Math.max(0, abv);
-  }
-
-  function initOGInput(pid) {
-    if (attached.has(pid)) return;
-    attached.add(pid);
-    const inp = document.getElementById('og-' + pid);
-    if (!inp) return;
-    // load saved OG if present
-    const saved = localStorage.getItem('og-' + pid);
-    if (saved) inp.value = saved;
-
-    const update = () => {
-      localStorage.setItem('og-' + pid, inp.value || '');
-      updateABVFor(pid);
-    };
-    inp.addEventListener('input', update);
-    // compute once on init
-    updateABVFor(pid);
-  }
-
-  function updateABVFor(pid) {
-    const info = lastDevices[pid] || {};
-    const ogInput = document.getElementById('og-' + pid);
-    const abvEl   = document.getElementById('abv-' + pid);
-    if (!ogInput || !abvEl) return;
-    const abv = calcABV(ogInput.value, info.gravity);
-    abvEl.textContent = (abv != null && !isNaN(abv)) ? abv.toFixed(2) : '--';
-  }
-
-  // If you’re coloring raw bytes elsewhere, keep that code as-is.
-  async function refreshStats() {
-    try {
-      const res = await fetch('/api/devices', { cache: 'no-store' });
-      const devices = await res.json();
-      lastDevices = devices; // cache
-
-      for (const [pid, info] of Object.entries(devices)) {
-        // ensure OG input exists and is wired
-        initOGInput(pid);
-
-        const t  = document.getElementById('temp-' + pid);
-        const g  = document.getElementById('grav-' + pid);
-        const r  = document.getElementById('rssi-' + pid);
-
-        if (t && info.temperature_c != null) t.textContent = Number(info.temperature_c).toFixed(2);
-        if (g && info.gravity != null)      g.textContent = Number(info.gravity).toFixed(3);
-        if (r && info.rssi != null)         r.textContent = info.rssi;
-
-        // recompute ABV now that we have fresh SG
-        updateABVFor(pid);
-
-        // if you also update the hex packet:
-        const rf = document.getElementById('rawfull-' + pid);
-        if (rf && info.raw_hex && typeof highlightIBeacon === 'function') {
-          rf.innerHTML = highlightIBeacon(info.raw_hex);
-        }
-      }
-    } catch (e) {
-      console.error(e);
-    }
-  }
-
-  setInterval(refreshStats, 2000);
-  refreshStats();
-</script>
-</body>
-</html>
-"""
+
+import orjson
+from flask import Flask, Response, request
+
+import tilt
+from tilt import (abv, discovered_devices, history_since, normalize_og, set_og,
+                  snapshot_devices, start_ble_scanner, wait_for_update)
 
 app = Flask(__name__)
 
+# Static page: cards are built in the browser from the /stream data. Read
+# once at import, so a request neither opens nor stats the file.
+with open(os.path.join(app.static_folder, "index.html"), "rb") as f:
+    _INDEX_HTML = f.read()
+_INDEX_HTML_GZ = gzip.compress(_INDEX_HTML, compresslevel=9)  # compressed once, not per request
+_INDEX_ETAG = hashlib.sha1(_INDEX_HTML).hexdigest()
+_INDEX_ETAG_GZ = _INDEX_ETAG + "-gz"  # distinct bytes need a distinct strong ETag
+
 @app.route("/")
 def index():
-    return render_template_string(TEMPLATE, devices=discovered_devices, colors=COLOR_MAP)
+    gz = "gzip" in request.accept_encodings
+    etag = _INDEX_ETAG_GZ if gz else _INDEX_ETAG
+    if request.if_none_match.contains_weak(etag):  # If-None-Match compares weakly
+        # reload of an unchanged page: answer before choosing a body
+        resp = Response(status=304)
+    else:
+        resp = Response(_INDEX_HTML_GZ if gz else _INDEX_HTML, mimetype="text/html")
+        if gz:
+            resp.headers["Content-Encoding"] = "gzip"
+    resp.set_etag(etag)
+    resp.vary.add("Accept-Encoding")
+    # short freshness window; after that the ETag makes revalidation a bodiless 304
+    resp.headers["Cache-Control"] = "public, max-age=30, stale-while-revalidate=60"
+    return resp
 
-def start_ble_thread():
-    t = threading.Thread(target=refresh_panel_forever, args=(2.0,), daemon=True)
-    t.start()
+@app.after_request
+def _immutable_static(resp):
+    # tilt.css / tilt.js are linked with a ?v= version, so the bytes behind
+    # such a URL never change and the browser need not revalidate them
+    if request.endpoint == "static" and "v" in request.args and resp.status_code == 200:
+        resp.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    return resp
 
-from tilt import discovered_devices, start_ble_scanner  # <-- import the starter
+def _raw_html(h):
+    """
+    Hex dump h of a Tilt advert with the iBeacon major (temp, bytes 20..21) and
+    minor (gravity, bytes 22..23) wrapped in highlight spans. Built with the
+    JSON payload, so the browser just assigns it.
+    """
+    return (h[:40]
+            + '<span class="hx-temp">' + h[40:44] + '</span>'
+            + '<span class="hx-grav">' + h[44:48] + '</span>'
+            + h[48:])
 
-app = Flask(__name__)
+def _devices_view(after_version=None):
+    """
+    JSON-safe view of a locked device snapshot, keyed by device_key, raw
+    bytes as the hex string cached by the BLE callback. With 'after_version', only
+    devices that changed after that devices_version are included. ABV is
+    computed here, once per data version, from the stored OG.
+    """
+    out = {}
+    og_map = tilt.og_map
+    for info in snapshot_devices().values():
+        if (after_version is not None and info.version is not None
+                and info.version <= after_version):
+            continue
+        key = info.key
+        og = og_map.get(key)
+        out[key] = {
+            "color": info.color,
+            "temperature": info.temperature,
+            "temperature_c": info.temperature_c,
+            "gravity": info.gravity,
+            "temp_str": info.temp_str,
+            "grav_str": info.grav_str,
+            "og": og,
+            "abv": abv(og, info.gravity) if og is not None else None,
+            "rssi": info.rssi,
+            "battery_weeks": info.battery_weeks,
+            "raw_hex": info.raw_hex,
+            "raw_html": _raw_html(info.raw_hex),
+            "last_seen_ts": info.last_seen_ts
+        }
+    return out
 
-@app.route("/")
-def index():
-    return render_template_string(TEMPLATE, devices=discovered_devices, colors=COLOR_MAP)
+# Distinguishes ETags across restarts, when the version counters start over
+_BOOT_ID = format(time.time_ns(), "x")
+
+def _not_modified(version):
+    """
+    Returns (etag, response): a bodiless 304 response if the client's
+    If-None-Match already names this data version, otherwise None.
+    """
+    etag = f"{_BOOT_ID}-{version}"
+    if request.if_none_match.contains_weak(etag):
+        resp = Response(status=304)
+        resp.set_etag(etag, weak=True)
+        return etag, resp
+    return etag, None
+
+def _unmodified_since(modified_ts):
+    """
+    True if the client validates with If-Modified-Since only (an ETag takes
+    precedence) and its copy was generated in a second after 'modified_ts'.
+    """
+    ims = request.if_modified_since
+    return not request.if_none_match and ims is not None and modified_ts < ims.timestamp()
+
+def _versioned(resp, etag):
+    """
+    Tags a full response with its data-version ETag; clients must revalidate.
+    """
+    resp.set_etag(etag, weak=True)
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp
+
+# key -> [data version, serialized JSON, gzipped JSON or None]; rebuilt once
+# per version and shared by all clients
+_blob_cache = {}
+_blob_lock = threading.Lock()  # one builder per miss; concurrent requests wait for it
+_BLOB_CACHE_MAX = 64  # bounds the per-?since entries; the cache is simply reset when full
+GZIP_MIN_SIZE = 512   # smaller payloads are not worth compressing
+
+def _cache_entry(name, version, build):
+    """
+    Returns the cache entry for 'name' at data 'version', serializing
+    build() with orjson only the first time that version is requested.
+    """
+    hit = _blob_cache.get(name)
+    if hit is not None and hit[0] == version:
+        return hit
+    with _blob_lock:
+        # another request may have built it while we waited
+        hit = _blob_cache.get(name)
+        if hit is not None and hit[0] == version:
+            return hit
+        # history columns are NumPy arrays, encoded by orjson without a list copy
+        entry = [version, orjson.dumps(build(), option=orjson.OPT_SERIALIZE_NUMPY), None]
+        if len(_blob_cache) >= _BLOB_CACHE_MAX:
+            _blob_cache.clear()
+        _blob_cache[name] = entry
+        return entry
+
+def _cached_blob(name, version, build):
+    """
+    Returns orjson.dumps(build()) for data 'version', cached per version.
+    """
+    return _cache_entry(name, version, build)[1]
+
+def _json_response(name, version, build, etag):
+    """
+    Versioned JSON response from the cache. Large payloads are sent gzipped
+    to clients that accept it, compressing once per version, not per request.
+    """
+    entry = _cache_entry(name, version, build)
+    resp = Response(entry[1], mimetype="application/json")
+    resp.vary.add("Accept-Encoding")
+    if len(entry[1]) >= GZIP_MIN_SIZE and "gzip" in request.accept_encodings:
+        if entry[2] is None:
+            entry[2] = gzip.compress(entry[1], compresslevel=6)
+        resp.set_data(entry[2])
+        resp.headers["Content-Encoding"] = "gzip"
+    return _versioned(resp, etag)
+
+def _devices_blob(version):
+    return _cached_blob("devices", version, _devices_view)
+
+def _delta_blob(seen_version, version):
+    # clients on the same stream are normally all one version behind, so
+    # they share this entry as well
+    return _cached_blob(("delta", seen_version), version,
+                        lambda: _devices_view(seen_version))
+
+@app.get("/api/devices")
+def api_devices():
+    # Last-Modified is the (whole) second in which this version was read: an
+    # update published after that has a later timestamp, so a client's copy is
+    # only treated as fresh if every update it could miss happened before it.
+    generated = time.time()
+    version = tilt.devices_version
+    etag, resp = _not_modified(version)
+    if resp is None and _unmodified_since(tilt.devices_modified_ts):
+        resp = Response(status=304)
+        resp.set_etag(etag, weak=True)
+    if resp is not None:
+        return resp
+    resp = _json_response("devices", version, _devices_view, etag)
+    resp.last_modified = generated
+    return resp
+
+@app.post("/api/og")
+def api_og():
+    """
+    Sets a Tilt's original gravity from JSON {"pid": ..., "og": "1.060" | 1060},
+    where pid is the device key used in /api/devices, or clears it with a
+    null/blank og. The new ABV reaches clients via /stream.
+    """
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict) or not isinstance(body.get("pid"), str):
+        return {"error": "expected JSON {pid, og}"}, 400
+    pid = body["pid"]
+    if pid not in {st.key for st in list(discovered_devices.values())}:
+        return {"error": "unknown pid"}, 404
+    og = body.get("og")
+    if og is None or og == "":
+        og = None
+    else:
+        og = normalize_og(og)
+        if og is None:
+            return {"error": "og must be an SG like 1.060 or points like 1060"}, 400
+    try:
+        set_og(pid, og)
+    except OSError as e:
+        return {"error": f"could not save OG: {e}"}, 500
+    return {"pid": pid, "og": og}
+
+SSE_KEEPALIVE = 30.0  # seconds; a comment line keeps idle proxies from closing the stream
+
+@app.get("/stream")
+def stream():
+    """
+    Server-Sent Events: pushes the full device map once on connect, then
+    'update' events carrying only the devices whose reading changed.
+    """
+    def generate():
+        version = wait_for_update(None)
+        yield b"data: " + _devices_blob(version) + b"\n\n"
+        while True:
+            current = wait_for_update(version, SSE_KEEPALIVE)
+            if current == version:
+                yield b": keepalive\n\n"
+                continue
+            yield b"event: update\ndata: " + _delta_blob(version, current) + b"\n\n"
+            version = current
+
+    return Response(generate(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache"})
+
+def _history_view(since=None):
+    """
+    JSON-safe history, one set of parallel arrays per device:
+    {pid: {'color', 'ts': [...], 'temp_c': [...], 'gravity': [...], 'rssi': [...]}}.
+    """
+    # maintained in this shape by the BLE thread and never mutated, so it is
+    # served as-is: no copy, no lock, no per-device lookups
+    view = tilt.history_view
+    if since is None:
+        return view
+    return {key: history_since(dev, since) for key, dev in view.items()}
 
 @app.get("/api/history")
 def api_history():
-    out = {}
-    # snapshot for thread safety; GIL is enough here but copy is cheap
-    for pid, dq in list(history.items()):
-        out[str(pid)] = {
-            "color": discovered_devices.get(pid, {}).get("color", "Unknown"),
-            "points": list(dq)  # [{'ts','temp_c','gravity','rssi'}, ...]
-        }
-    return jsonify(out)
+    """
+    Per-device history. With ?since=<epoch ms> only newer points are sent,
+    so a client that already holds the series fetches just the new tail.
+    """
+    version = tilt.history_version
+    etag, resp = _not_modified(version)
+    if resp is not None:
+        return resp
+    since = request.args.get("since", type=int)
+    # up-to-date clients all ask for the same ?since, so those share one blob too
+    return _json_response(("history", since), version, lambda: _history_view(since), etag)
+
+@app.get("/api/snapshot")
+def api_snapshot():
+    """
+    Devices and history in one response ({'devices': ..., 'history': ...}),
+    so a client needs a single request per refresh instead of two.
+    """
+    version = f"{tilt.devices_version}.{tilt.history_version}"
+    etag, resp = _not_modified(version)
+    if resp is not None:
+        return resp
+    return _json_response("snapshot", version,
+                          lambda: {"devices": _devices_view(), "history": _history_view()},
+                          etag)
 
 if __name__ == "__main__":
     start_ble_scanner()
-    # Important: avoid the Flask reloader so you don’t start BLE twice
-    app.run(debug=True, use_reloader=False, host="0.0.0.0", port=1234)
+    # Important: avoid the Flask reloader so you don’t start BLE twice.
+    # Development server only; see wsgi.py for running under gunicorn.
+    app.run(debug=False, use_reloader=False, threaded=True, host="0.0.0.0", port=1234)
 
@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+"""
+WSGI entry point for running the Tilt dashboard under a production server:
+
+    gunicorn -w 1 -k gthread --threads 32 -b 0.0.0.0:1234 wsgi:application
+
+Keep a single worker: readings and history live in this process, fed by
+the BLE scanner started below. Don't use --preload, so the scanner starts
+in the worker rather than in the master before the fork.
+
+Every open dashboard holds one thread for its /stream connection, so size
+--threads for the expected tabs plus a few for the JSON endpoints. Avoid
+the gevent worker: the scanner's callbacks run on a CoreBluetooth dispatch
+thread, which monkey-patched locks and conditions do not expect.
+
+Over HTTP/1.1 a browser opens at most ~6 connections per host, and each
+dashboard tab keeps one busy with /stream, so many tabs in one browser
+stall. HTTP/2 multiplexes them over one connection; browsers only speak it
+over TLS, e.g. with hypercorn (which serves this WSGI app directly):
+
+    hypercorn --certfile cert.pem --keyfile key.pem -b 0.0.0.0:1234 wsgi:application
+"""
+from tilt import start_ble_scanner
+from tilt_dashboard import app
+
+start_ble_scanner()
+
+application = app